@@ -1,24 +1,72 @@
 import os
-import json
+import orjson
 import re
 from pathlib import Path
 import fitz  # PyMuPDF
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+
+_HEADING_PATTERNS = [
+    r'(\d+(?:\.\d+)*\.?)\s+(.+)$',               # Numbered headings: 1., 1.1, 1.1.1
+    r'([IVX]+\.)\s+(.+)$',                          # Roman numerals
+    r'([A-Z]\.)\s+(.+)$',                           # Letters: A., B.
+    r'(Chapter|Section|Part)\s+(\d+[:\-\s]*(.+))$',  # Chapter 1, Section 2
+    r'(Abstract|Introduction|Methodology|Results|Discussion|Conclusion|References|Bibliography|Acknowledgments)\s*$'
+]
+# All heading patterns as one alternation, matched against stripped text; group
+# "p<i>" wraps pattern i, so match.lastgroup names the first pattern that matched.
+_COMBINED_HEADING_RE = re.compile(
+    '|'.join(f'(?P<p{i}>{p})' for i, p in enumerate(_HEADING_PATTERNS)),
+    re.IGNORECASE
+)
+# Standalone section names matched by the last heading pattern; ASCII text is
+# looked up here instead of running the regex.
+_HEADING_KEYWORDS = frozenset({
+    'abstract', 'introduction', 'methodology', 'results', 'discussion',
+    'conclusion', 'references', 'bibliography', 'acknowledgments'
+})
+_HEADING_KEYWORD_PATTERN_ID = f'p{len(_HEADING_PATTERNS) - 1}'
+_MAX_HEADING_KEYWORD_LEN = max(len(k) for k in _HEADING_KEYWORDS)
+# Cheap pre-check for _COMBINED_HEADING_RE once keywords are ruled out: a match
+# needs a digit or roman numeral first, a letter followed by '.', or a
+# Chapter/Section/Part prefix.
+_HEADING_FIRST_CHARS = frozenset('0123456789IVXivx')
+_HEADING_KEYWORD_PREFIXES = ('chapter', 'section', 'part')
+_NUMBERED_FORM_RE = re.compile(r"\d+(\(\w\))?\.\s+")
+_NUMBERED_HEADING_RE = re.compile(r'\d+(?:\.\d+)*\.?\s')
+_TITLE_SKIP_RE = re.compile(r'page|doi:|http|www\.|@|copyright', re.IGNORECASE)
+_BOLD_FLAG = 1 << 4  # PyMuPDF span flag for bold text
+# Text extraction flags without TEXT_PRESERVE_IMAGES, so image blocks are not decoded
+_TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
 
 
 class PDFStructureExtractor:
-    def __init__(self):
-        self.heading_patterns = [
-            r'^\s*(\d+(?:\.\d+)*\.?)\s+(.+)$',               # Numbered headings: 1., 1.1, 1.1.1
-            r'^\s*([IVX]+\.)\s+(.+)$',                          # Roman numerals
-            r'^\s*([A-Z]\.)\s+(.+)$',                           # Letters: A., B.
-            r'^\s*(Chapter|Section|Part)\s+(\d+[:\-\s]*(.+))$',  # Chapter 1, Section 2
-            r'^\s*(Abstract|Introduction|Methodology|Results|Discussion|Conclusion|References|Bibliography|Acknowledgments)\s*$'
-        ]
+    def match_heading_pattern(self, stripped: str):
+        c = stripped[0]
+        if c not in _HEADING_FIRST_CHARS and c.isascii() and stripped[1:2] != '.':
+            head = stripped[:7]
+            if head.isascii() and not head.lower().startswith(_HEADING_KEYWORD_PREFIXES):
+                return None
+        return _COMBINED_HEADING_RE.match(stripped)
+
+    def match_heading(self, stripped: str) -> Tuple[Optional[str], int]:
+        if self.is_heading_keyword(stripped):
+            return _HEADING_KEYWORD_PATTERN_ID, 0
+        match = self.match_heading_pattern(stripped)
+        if match is None:
+            return None, 0
+        pattern_id = match.lastgroup
+        number_part = match.group(match.re.groupindex[pattern_id] + 1)
+        return pattern_id, number_part.count('.')
+
+    def is_heading_keyword(self, stripped: str) -> bool:
+        return len(stripped) <= _MAX_HEADING_KEYWORD_LEN and stripped.lower() in _HEADING_KEYWORDS
 
     def is_numbered_form_label(self, text: str) -> bool:
-        return bool(re.match(r"^\s*\d+(\(\w\))?\.\s+", text))
+        return bool(_NUMBERED_FORM_RE.match(text))
 
     def extract_title_from_metadata(self, doc) -> str:
         try:
@@ -34,8 +82,9 @@ class PDFStructureExtractor:
     def extract_title_from_text(self, doc) -> str:
         try:
             first_page = doc[0]
-            blocks = first_page.get_text("dict")["blocks"]
-            candidates = []
+            blocks = first_page.get_text("dict", flags=_TEXT_FLAGS)["blocks"]
+            best_text = None
+            best_score = float('-inf')
             for block in blocks:
                 if "lines" not in block:
                     continue
@@ -49,50 +98,36 @@ class PDFStructureExtractor:
                         font_size = span["size"]
                         size_score = font_size * 10
                         font_flags = span.get("flags", 0)
-                        format_score = 50 if font_flags & 2**4 else 0
+                        format_score = 50 if font_flags & _BOLD_FLAG else 0
                         total_score = position_score + size_score + format_score
-                        candidates.append({
-                            'text': text,
-                            'score': total_score,
-                            'y_pos': y_pos,
-                            'font_size': font_size
-                        })
-            filtered_candidates = []
-            for candidate in candidates:
-                text = candidate['text'].lower()
-                if not any(skip in text for skip in ['page', 'doi:', 'http', 'www.', '@', 'copyright']):
-                    if not re.match(r'^\d+$', candidate['text'].strip()):
-                        filtered_candidates.append(candidate)
-            if filtered_candidates:
-                best_candidate = sorted(filtered_candidates, key=lambda x: x['score'], reverse=True)[0]
-                return best_candidate['text']
+                        if total_score <= best_score:
+                            continue
+                        if _TITLE_SKIP_RE.search(text) or text.isdecimal():
+                            continue
+                        best_score = total_score
+                        best_text = text
+            if best_text is not None:
+                return best_text
         except Exception as e:
             print(f"Error extracting title from text: {e}")
         return "Untitled Document"
 
-    def classify_heading_level(self, text: str, font_size: float, avg_font_size: float, is_bold: bool, is_numbered: bool) -> str:
-        for pattern in self.heading_patterns:
-            match = re.match(pattern, text.strip(), re.IGNORECASE)
-            if match:
-                if is_numbered:
-                    number_part = match.group(1)
-                    if '.' in number_part:
-                        level_depth = number_part.count('.')
-                        if level_depth == 1:
-                            return "H1"
-                        elif level_depth == 2:
-                            return "H2"
-                        else:
-                            return "H3"
-                    else:
-                        return "H1"
+    def classify_heading_level(self, pattern_id: Optional[str], number_dots: int, font_size: float, avg_font_size: float, is_bold: bool, is_numbered: bool) -> str:
+        if pattern_id is not None:
+            if is_numbered:
+                if number_dots == 2:
+                    return "H2"
+                elif number_dots > 2:
+                    return "H3"
+                else:
+                    return "H1"
+            else:
+                if font_size > avg_font_size * 1.3 or is_bold:
+                    return "H1"
+                elif font_size > avg_font_size * 1.1:
+                    return "H2"
                 else:
-                    if font_size > avg_font_size * 1.3 or is_bold:
-                        return "H1"
-                    elif font_size > avg_font_size * 1.1:
-                        return "H2"
-                    else:
-                        return "H3"
+                    return "H3"
         if font_size > avg_font_size * 1.5:
             return "H1"
         elif font_size > avg_font_size * 1.2:
@@ -100,12 +135,12 @@ class PDFStructureExtractor:
         else:
             return "H3"
 
-    def is_likely_heading(self, text: str, font_size: float, avg_font_size: float, is_bold: bool, position_y: float, page_height: float) -> bool:
-        if len(text.strip()) < 3 or len(text.strip()) > 200:
+    def is_likely_heading(self, stripped: str, stripped_len: int, pattern_id: Optional[str], font_size: float, avg_font_size: float, is_bold: bool, position_y: float, page_height: float) -> bool:
+        if stripped_len < 3 or stripped_len > 200:
             return False
-        if self.is_numbered_form_label(text):
+        if stripped[0].isdigit() and self.is_numbered_form_label(stripped):
             return False
-        has_heading_pattern = any(re.match(pattern, text.strip(), re.IGNORECASE) for pattern in self.heading_patterns)
+        has_heading_pattern = pattern_id is not None
         is_larger_font = font_size > avg_font_size * 1.1
         relative_position = position_y / page_height
         if has_heading_pattern:
@@ -118,49 +153,57 @@ class PDFStructureExtractor:
 
     def extract_headings(self, doc) -> List[Dict[str, Any]]:
         headings = []
-        font_sizes = []
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            blocks = page.get_text("dict")["blocks"]
-            for block in blocks:
-                if "lines" not in block:
-                    continue
-                for line in block["lines"]:
-                    for span in line["spans"]:
-                        if span["text"].strip():
-                            font_sizes.append(span["size"])
-        avg_font_size = sum(font_sizes) / len(font_sizes) if font_sizes else 12
-
-        for page_num in range(len(doc)):
-            page = doc[page_num]
+        seen_headings = set()
+        font_size_total = 0.0
+        font_size_count = 0
+        pages_lines = []
+        for page_num, page in enumerate(doc):
             page_height = page.rect.height
-            blocks = page.get_text("dict")["blocks"]
+            blocks = page.get_text("dict", flags=_TEXT_FLAGS)["blocks"]
             for block in blocks:
                 if "lines" not in block:
                     continue
                 for line in block["lines"]:
-                    line_text = ""
-                    line_spans = []
+                    line_parts = []
+                    best_len = -1
+                    dominant_span = None
                     for span in line["spans"]:
-                        line_text += span["text"]
-                        line_spans.append(span)
-                    line_text = line_text.strip()
+                        span_text = span["text"]
+                        if span_text.strip():
+                            font_size_total += span["size"]
+                            font_size_count += 1
+                        line_parts.append(span_text)
+                        span_len = len(span_text)
+                        if span_len > best_len:
+                            best_len = span_len
+                            dominant_span = span
+                    line_text = "".join(line_parts).strip()
                     if not line_text:
                         continue
-                    if line_spans:
-                        dominant_span = max(line_spans, key=lambda s: len(s["text"]))
-                        font_size = dominant_span["size"]
-                        font_flags = dominant_span.get("flags", 0)
-                        is_bold = bool(font_flags & 2**4)
-                        position_y = dominant_span["bbox"][1]
-                        if self.is_likely_heading(line_text, font_size, avg_font_size, is_bold, position_y, page_height):
-                            is_numbered = bool(re.match(r'^\s*\d+(?:\.\d+)*\.?\s', line_text))
-                            level = self.classify_heading_level(line_text, font_size, avg_font_size, is_bold, is_numbered)
-                            headings.append({
-                                "level": level,
-                                "text": line_text,
-                                "page": page_num + 1
-                            })
+                    pages_lines.append((
+                        page_num,
+                        page_height,
+                        line_text,
+                        dominant_span["size"],
+                        bool(dominant_span.get("flags", 0) & _BOLD_FLAG),
+                        dominant_span["bbox"][1]
+                    ))
+        avg_font_size = font_size_total / font_size_count if font_size_count else 12
+
+        for page_num, page_height, line_text, font_size, is_bold, position_y in pages_lines:
+            heading_key = (line_text, page_num)
+            if heading_key in seen_headings:
+                continue
+            pattern_id, number_dots = self.match_heading(line_text)
+            if self.is_likely_heading(line_text, len(line_text), pattern_id, font_size, avg_font_size, is_bold, position_y, page_height):
+                is_numbered = line_text[0].isdigit() and bool(_NUMBERED_HEADING_RE.match(line_text))
+                level = self.classify_heading_level(pattern_id, number_dots, font_size, avg_font_size, is_bold, is_numbered)
+                seen_headings.add(heading_key)
+                headings.append({
+                    "level": level,
+                    "text": line_text,
+                    "page": page_num + 1
+                })
         return headings
 
     def process_pdf(self, pdf_path: str) -> Dict[str, Any]:
@@ -170,31 +213,50 @@ class PDFStructureExtractor:
             if not title:
                 title = self.extract_title_from_text(doc)
             headings = self.extract_headings(doc)
-            seen_headings = set()
-            unique_headings = []
-            for heading in headings:
-                heading_key = (heading["text"], heading["page"])
-                if heading_key not in seen_headings:
-                    seen_headings.add(heading_key)
-                    unique_headings.append(heading)
-            unique_headings.sort(key=lambda x: x["page"])
             doc.close()
             return {
                 "title": title,
-                "outline": unique_headings
+                "outline": headings
             }
         except Exception as e:
             print(f"Error processing PDF {pdf_path}: {e}")
-            return {
-                "title": "Error Processing Document",
-                "outline": []
-            }
+            return _error_result()
+
+
+def _error_result() -> Dict[str, Any]:
+    return {
+        "title": "Error Processing Document",
+        "outline": []
+    }
+
+
+def _worker(pdf_path: str) -> Dict[str, Any]:
+    print(f"Processing: {Path(pdf_path).name}")
+    return PDFStructureExtractor().process_pdf(pdf_path)
+
+
+def _process_isolated(pdf_path: str) -> Dict[str, Any]:
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            return executor.submit(_worker, pdf_path).result()
+        except Exception as e:
+            print(f"Error processing PDF {pdf_path}: {e}")
+            return _error_result()
+
+
+def _save_result(output_dir: Path, pdf_path: str, result: Dict[str, Any], json_option) -> None:
+    output_filename = Path(pdf_path).stem + ".json"
+    output_path = output_dir / output_filename
+    with open(output_path, 'wb') as f:
+        f.write(orjson.dumps(result, option=json_option))
+    print(f"Saved: {output_filename}")
 
 
 def main():
     parser = argparse.ArgumentParser(description='Extract PDF structure for Adobe Challenge 1A')
     parser.add_argument('--input-dir', default='./input', help='Input directory containing PDFs')
     parser.add_argument('--output-dir', default='./output', help='Output directory for JSON files')
+    parser.add_argument('--pretty', action='store_true', help='Write indented JSON instead of compact output')
     args = parser.parse_args()
 
     input_dir = Path(args.input_dir)
@@ -202,21 +264,36 @@ def main():
     input_dir.mkdir(parents=True, exist_ok=True)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    extractor = PDFStructureExtractor()
     pdf_files = list(input_dir.glob("*.pdf"))
     if not pdf_files:
         print(f"No PDF files found in {input_dir}")
         print(f"Please add PDF files to the '{input_dir}' directory and run again.")
         return
     print(f"Found {len(pdf_files)} PDF files to process")
-    for pdf_file in pdf_files:
-        print(f"Processing: {pdf_file.name}")
-        result = extractor.process_pdf(str(pdf_file))
-        output_filename = pdf_file.stem + ".json"
-        output_path = output_dir / output_filename
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
-        print(f"Saved: {output_filename}")
+    json_option = orjson.OPT_INDENT_2 if args.pretty else None
+    pdf_paths = [str(p) for p in pdf_files]
+    if len(pdf_paths) == 1:
+        _save_result(output_dir, pdf_paths[0], _worker(pdf_paths[0]), json_option)
+    else:
+        max_workers = min(len(pdf_paths), os.cpu_count() or 1)
+        broken_paths = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_worker, path): path for path in pdf_paths}
+            for future in as_completed(futures):
+                pdf_path = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken_paths.append(pdf_path)
+                    continue
+                except Exception as e:
+                    print(f"Error processing PDF {pdf_path}: {e}")
+                    result = _error_result()
+                _save_result(output_dir, pdf_path, result, json_option)
+        # A crashed worker fails every pending file in the pool; retry those one
+        # at a time so only the PDF that actually crashes gets an error result.
+        for pdf_path in broken_paths:
+            _save_result(output_dir, pdf_path, _process_isolated(pdf_path), json_option)
     print("Processing complete!")
 
 